@@ -1,18 +1,22 @@
 import asyncio
+import hashlib
 import sqlite3
 import os
 import json
 import re
 from datetime import datetime
+from functools import lru_cache
+from itertools import batched, islice
 from dataclasses import dataclass
 from typing import Optional, List
 import logging
 
 import httpx
 import feedparser
-from bs4 import BeautifulSoup
+import orjson
 from dotenv import load_dotenv
 from groq import AsyncGroq
+from selectolax.lexbor import LexborHTMLParser
 
 # --- CONFIGURATION ---
 load_dotenv()
@@ -25,6 +29,37 @@ logger = logging.getLogger(__name__)
 
 DB_PATH = "../../docs/job_aggregator.db"
 RESUME_PATH = "resume.txt"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+# Groq free tier allows llama-3.1-8b-instant 30 RPM but only 6,000 tokens per
+# minute. A scoring request is a few thousand tokens, so the token budget binds:
+# each request start is spaced by its batch's estimated share of that budget,
+# and never closer than 2.5s (~24 RPM)
+AI_MAX_CONCURRENCY = 5
+AI_MIN_INTERVAL = 2.5
+AI_TOKENS_PER_MINUTE = 6000
+AI_CHARS_PER_TOKEN = 4  # Rough English average; only used for pacing
+AI_OUTPUT_TOKENS_PER_JOB = 100  # One-sentence reason plus a 50-word why_me
+# Jobs scored per request; the resume prefix is sent once per batch. Six
+# full-length descriptions plus the prompt come to ~4.7k tokens, under one
+# minute's budget with room for estimation error
+AI_BATCH_SIZE = 6
+AI_FALLBACK_REASON = "AI unavailable — unscored"
+FIT_CACHE_TTL = "-30 days"  # SQLite date modifier; older cached scores are recomputed
+# Discord webhooks allow 5 requests per 2 seconds
+DISCORD_MIN_INTERVAL = 0.4
+DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
+DASHBOARD_URL = "https://jrichwiltshire.github.io/Portfolio"
+# Embed colors: Green for 9-10, Yellow for 7-8
+COLOR_STRONG_FIT = 5025616
+COLOR_GOOD_FIT = 16776960
+PROMPT_CHAR_LIMIT = 2000
+MAX_PER_SOURCE = 100  # The big feeds stop collecting title matches past this many
+MAX_HTML_BYTES = 5_000_000  # Anything bigger than this is not a normal job board page
+# Sources that fill title/company with placeholders ("HN: {kw} Role", "HN Startup",
+# "Jobspresso Listing"), so norm_key can't tell their roles apart; they're deduped
+# by external_id alone
+NORM_KEY_EXEMPT_SOURCES = frozenset({"HackerNews", "Jobspresso"})
 
 try:
     with open(RESUME_PATH, "r") as f:
@@ -33,9 +68,12 @@ except FileNotFoundError:
     MY_RESUME = ""
     logger.warning("resume.txt not found. AI scoring will be less accurate.")
 
+# The resume is constant for the run, so trim it once rather than per prompt
+RESUME_SNIPPET = MY_RESUME[:PROMPT_CHAR_LIMIT]
+
 
 # --- 1. DATA MODEL ---
-@dataclass
+@dataclass(slots=True)
 class JobListing:
     source: str
     external_id: str
@@ -48,13 +86,31 @@ class JobListing:
     min_salary: Optional[int] = None
     max_salary: Optional[int] = None
     why_me: Optional[str] = None
+    score: Optional[int] = None
+    reason: Optional[str] = None
 
 
 # --- 2. DATABASE LOGIC ---
+_CLEAN_RE = re.compile(r"[^a-zA-Z0-9]")
+
+
+def _clean(s):
+    """Removes special chars and lowercases for a 'fuzzy' match."""
+    return _CLEAN_RE.sub("", s or "").lower()
+
+
+def norm_key(title, company):
+    """Fuzzy identity of a role, stored per row so duplicate checks are an index lookup."""
+    return f"{_clean(title)}|{_clean(company)}"
+
+
 class JobDatabase:
     def __init__(self, db_name=DB_PATH):
         os.makedirs(os.path.dirname(db_name), exist_ok=True)
+        # One connection for the whole run: sqlite3 caches prepared statements
+        # per connection, so repeated queries skip re-parsing
         self.conn = sqlite3.connect(db_name)
+        self.conn.execute("PRAGMA cache_size = -20000")  # ~20 MB page cache
         self.create_table()
 
     def create_table(self):
@@ -71,27 +127,120 @@ class JobDatabase:
             min_salary INTEGER,
             max_salary INTEGER,
             applied INTEGER DEFAULT 0,
-            why_me TEXT
+            why_me TEXT,
+            score INTEGER,
+            reason TEXT,
+            norm_key TEXT
         )
         """
         self.conn.execute(query)
-        # Migration: Add column if it doesn't exist (for existing DBs)
-        try:
-            self.conn.execute("ALTER TABLE jobs ADD COLUMN why_me TEXT")
-        except sqlite3.OperationalError:
-            pass  # Column already exists
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fit_cache (
+                key TEXT PRIMARY KEY,
+                score INTEGER,
+                reason TEXT,
+                why_me TEXT,
+                created_at TEXT
+            )
+            """
+        )
+        # Migration: Add columns if they don't exist (for existing DBs)
+        existing = {
+            table: {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            for table in ("jobs", "fit_cache")
+        }
+        for table, column in (
+            ("jobs", "why_me TEXT"),
+            ("jobs", "score INTEGER"),
+            ("jobs", "reason TEXT"),
+            ("jobs", "norm_key TEXT"),
+            ("fit_cache", "created_at TEXT"),
+        ):
+            if column.split()[0] not in existing[table]:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+        # Backfill norm_key for rows written before the column existed
+        rows = self.conn.execute(
+            "SELECT rowid, title, company FROM jobs WHERE norm_key IS NULL"
+        ).fetchall()
+        self.conn.executemany(
+            "UPDATE jobs SET norm_key = ? WHERE rowid = ?",
+            [(norm_key(title, company), rowid) for rowid, title, company in rows],
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_applied_score ON jobs(applied, score)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_norm_key ON jobs(norm_key, posted_date)"
+        )
         self.conn.commit()
 
-    def job_exists(self, external_id):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT 1 FROM jobs WHERE external_id = ?", (external_id,))
-        return cursor.fetchone() is not None
+    def _select_in(self, query, values):
+        """Runs a single-column SELECT with an `IN ({})` placeholder over values, returning a set."""
+        values = list(values)
+        found = set()
+        # Older SQLite builds cap a statement at 999 bound parameters
+        for i in range(0, len(values), 999):
+            chunk = values[i : i + 999]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self.conn.execute(query.format(placeholders), chunk)
+            found.update(row[0] for row in rows)
+        return found
+
+    def known_ids(self, external_ids):
+        """Returns the subset of external_ids already stored, in as few queries as possible."""
+        return self._select_in(
+            "SELECT external_id FROM jobs WHERE external_id IN ({})", external_ids
+        )
 
-    def upsert_job(self, job: JobListing):
-        """Inserts a job, or ignores it if the external_id already exists."""
-        query = "INSERT OR IGNORE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
-        self.conn.execute(
-            query,
+    def recent_norm_keys(self, keys):
+        """Returns the subset of norm_keys posted within the last 7 days (fuzzy duplicate check)."""
+        return self._select_in(
+            "SELECT DISTINCT norm_key FROM jobs WHERE norm_key IN ({}) AND posted_date > date('now', '-7 days')",
+            set(keys),
+        )
+
+    def get_cached_fit(self, key):
+        """Returns a previously computed fit score for this cache key, if any."""
+        row = self.conn.execute(
+            "SELECT score, reason, why_me FROM fit_cache WHERE key = ? AND created_at > datetime('now', ?)",
+            (key, FIT_CACHE_TTL),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"score": row[0], "reason": row[1], "why_me": row[2]}
+
+    def cache_fits(self, entries):
+        """Stores (key, fit) pairs in one transaction."""
+        rows = [
+            (key, fit["score"], fit.get("reason"), fit.get("why_me"))
+            for key, fit in entries
+        ]
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO fit_cache (key, score, reason, why_me, created_at)
+                VALUES (?, ?, ?, ?, datetime('now'))
+                """,
+                rows,
+            )
+
+    def upsert_jobs(self, jobs: List[JobListing]):
+        """Inserts jobs in one transaction; existing rows only gain an AI analysis they were missing."""
+        # Columns are named because migrated DBs append new ones in ALTER order
+        query = """
+        INSERT INTO jobs (
+            external_id, source, title, company, location, link, description,
+            posted_date, min_salary, max_salary, applied, why_me, score, reason,
+            norm_key
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(external_id) DO UPDATE SET
+            why_me = excluded.why_me,
+            score = excluded.score,
+            reason = excluded.reason
+        WHERE jobs.why_me IS NULL
+        """
+        rows = [
             (
                 job.external_id,
                 job.source,
@@ -105,12 +254,69 @@ class JobDatabase:
                 job.max_salary,
                 0,
                 job.why_me,
-            ),
-        )
-        self.conn.commit()
+                job.score,
+                job.reason,
+                norm_key(job.title, job.company),
+            )
+            for job in jobs
+        ]
+        with self.conn:
+            self.conn.executemany(query, rows)
 
 
 # --- 3. UTILITIES ---
+class RateLimiter:
+    """Spaces out request starts so that at most one begins every `min_interval` seconds."""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self, interval=0.0):
+        """Waits for the next slot; ``interval`` widens the gap after this start beyond min_interval."""
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + max(self.min_interval, interval)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+@lru_cache(maxsize=None)
+def _keyword_pattern(keywords):
+    return re.compile("|".join(map(re.escape, keywords)), re.IGNORECASE)
+
+
+def keyword_matcher(keywords):
+    """Returns a case-insensitive "text contains any keyword" predicate, compiled once per keyword set."""
+    if not keywords:
+        return lambda text: False
+    return _keyword_pattern(tuple(keywords)).search
+
+
+_LOCATION_WHITELIST = [
+    "remote", "hybrid", "austin", "texas",
+    "anywhere", "worldwide", "united states", "usa",
+    "us only", "north america", "us-based", "us based",
+]
+_matches_location = keyword_matcher(_LOCATION_WHITELIST)
+
+
+def is_location_relevant(location: str) -> bool:
+    if not location:
+        return True
+    return bool(_matches_location(location))
+
+
+# Alternatives are tried in priority order at each "$", so one scan finds all three kinds
+_SALARY_RE = re.compile(
+    r"\$(?P<hr_lo>\d+)(?:-\$(?P<hr_hi>\d+))?/hr"
+    r"|\$(?P<k>\d{2,3})k"
+    r"|\$(?P<std>\d{4,7})"
+)
+
+
 def extract_salary(text):
     """
     Parses salary text to return (min_annual, max_annual).
@@ -121,88 +327,164 @@ def extract_salary(text):
 
     text = text.lower().replace(",", "")
 
-    # 1. Hourly check ($50-80/hr)
-    hourly_matches = re.findall(r"\$(\d+)(?:-\$(\d+))?/hr", text)
-    if hourly_matches:
-        # Take the first match
-        low, high = hourly_matches[0]
-        min_sal = int(low) * 2080
-        max_sal = int(high) * 2080 if high else min_sal
-        return (min_sal, max_sal)
+    k_nums = []
+    std_nums = []
+    for m in _SALARY_RE.finditer(text):
+        if m["hr_lo"]:
+            # 1. Hourly ($50-80/hr) wins outright; take the first match
+            min_sal = int(m["hr_lo"]) * 2080
+            max_sal = int(m["hr_hi"]) * 2080 if m["hr_hi"] else min_sal
+            return (min_sal, max_sal)
+        if m["k"]:
+            k_nums.append(int(m["k"]) * 1000)
+        else:
+            std_nums.append(int(m["std"]))
 
     # 2. 'k' suffix check ($120k - $150k)
     # Matches $120k or $120-150k
-    k_matches = re.findall(r"\$(\d{2,3})k", text)
-    if k_matches:
-        nums = [int(m) * 1000 for m in k_matches]
-        return (min(nums), max(nums))
+    if k_nums:
+        return (min(k_nums), max(k_nums))
 
     # 3. Standard check ($120000)
     # Look for large numbers
-    std_matches = re.findall(r"\$(\d{4,7})", text)
-    if std_matches:
-        nums = [
-            int(m) for m in std_matches if int(m) > 15000
-        ]  # Filter out tiny numbers
-        if nums:
-            return (min(nums), max(nums))
+    nums = [n for n in std_nums if n > 15000]  # Filter out tiny numbers
+    if nums:
+        return (min(nums), max(nums))
 
     return (None, None)
 
 
-async def calculate_fit_score(job: JobListing, resume_text: str):
-    """Uses AI to compare the job to your resume."""
-    if not resume_text:
-        return {"score": 5, "reason": "No resume provided."}
+_WHITESPACE_RE = re.compile(r"\s+")
+
 
-    prompt = f"""You are a career coach evaluating a job for a candidate based in Austin, TX.
+def prompt_text(text, limit=PROMPT_CHAR_LIMIT):
+    """Strips markup and collapses whitespace so the prompt budget goes to actual content."""
+    if not text:
+        return ""
+    if "<" in text:
+        text = LexborHTMLParser(text).text(separator=" ")
+    return _WHITESPACE_RE.sub(" ", text).strip()[:limit]
+
+
+def fit_cache_key(job: JobListing, description: str, resume_text: str):
+    """Hashes everything the scoring prompt sends: resume, title, company and description.
+
+    ``description`` is the job's ``prompt_text``, computed once by the caller.
+    """
+    content = "\n".join((resume_text, job.title or "", job.company or "", description))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def scoring_system_prompt(resume_text: str):
+    """Everything constant across jobs, built once so every request shares a byte-identical prefix."""
+    return f"""You are a career coach evaluating jobs for a candidate based in Austin, TX.
+You will receive a JSON array of jobs, each with an id, title, company and description. Evaluate each job independently.
 
 The candidate can ONLY accept:
 1. Fully remote positions with no required in-office days, OR
 2. Positions located in Austin, TX
 
-If the job requires in-office or on-site presence at any location other than Austin, TX — including hybrid schedules at a non-Austin office — respond with ONLY:
-{{"score": 1, "reason": "Requires in-office presence outside Austin, TX", "why_me": "N/A — location mismatch"}}
+If a job requires in-office or on-site presence at any location other than Austin, TX — including hybrid schedules at a non-Austin office — its result must be:
+{{"id": <the job's id>, "score": 1, "reason": "Requires in-office presence outside Austin, TX", "why_me": "N/A — location mismatch"}}
 
 Otherwise, score the fit (1-10) based on the candidate's resume below.
 
-Resume: {resume_text[:2000]}
-Job: {job.title} at {job.company}
-Description: {job.description[:2000]}
+Resume: {resume_text}
 
-Respond with ONLY valid JSON. All values must be primitives — no arrays.
-Use this exact schema:
-{{"score": 7, "reason": "One sentence.", "why_me": "* Bullet one\\n* Bullet two\\n* Bullet three"}}
+Respond with ONLY valid JSON containing one result per job, using the job's id.
+Result values must be primitives — no arrays. Use this exact schema:
+{{"results": [{{"id": <the job's id>, "score": 7, "reason": "One sentence.", "why_me": "* Bullet one\\n* Bullet two\\n* Bullet three"}}]}}
 
 The why_me field must be a single string with 3 bullet points (max 50 words total) separated by newlines."""
 
+
+def estimate_batch_tokens(descriptions: List[str], resume_text: str):
+    """Rough prompt + completion size of one scoring request, for pacing against the TPM limit."""
+    # ~100 chars per job covers its id, title, company and the JSON around them
+    prompt_chars = len(scoring_system_prompt(resume_text)) + sum(
+        len(description) + 100 for description in descriptions
+    )
+    return (
+        prompt_chars // AI_CHARS_PER_TOKEN
+        + AI_OUTPUT_TOKENS_PER_JOB * len(descriptions)
+    )
+
+
+async def calculate_fit_scores_batch(
+    jobs: List[JobListing], descriptions: List[str], resume_text: str
+):
+    """Uses AI to compare a batch of jobs to your resume in one request.
+
+    ``descriptions`` holds each job's ``prompt_text``, in the same order as ``jobs``.
+    Returns one fit dict per job, in the same order as ``jobs``.
+    """
+    if not resume_text:
+        return [{"score": 5, "reason": "No resume provided."} for _ in jobs]
+
+    # Only the jobs vary between calls, so they go last where they can't
+    # break the provider's prefix cache on the system message
+    jobs_prompt = orjson.dumps(
+        [
+            {
+                "id": i,
+                "title": job.title,
+                "company": job.company,
+                "description": description,
+            }
+            for i, (job, description) in enumerate(zip(jobs, descriptions))
+        ]
+    ).decode()
+
+    fallback = {"score": 5, "reason": AI_FALLBACK_REASON}
     try:
         response = await _groq_client.chat.completions.create(
             model="llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": prompt}],
+            messages=[
+                {"role": "system", "content": scoring_system_prompt(resume_text)},
+                {"role": "user", "content": jobs_prompt},
+            ],
             response_format={"type": "json_object"},
         )
-        result = json.loads(response.choices[0].message.content)
+        results = json.loads(response.choices[0].message.content)["results"]
+    except Exception as e:
+        logger.error(f"AI Error: {e}")
+        return [fallback] * len(jobs)
+
+    by_id = {}
+    for result in results:
+        try:
+            by_id[int(result.pop("id"))] = result
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
         # Defensive: model sometimes returns why_me as a list despite instructions
         if isinstance(result.get("why_me"), list):
             result["why_me"] = "\n".join(result["why_me"])
-        return result
-    except Exception as e:
-        logger.error(f"AI Error: {e}")
-        return {"score": 5, "reason": "AI unavailable — unscored"}
 
+    fits = []
+    for i, job in enumerate(jobs):
+        result = by_id.get(i)
+        # A result missing either field is unusable, so the job falls back
+        # rather than raising later when the fit is stored or sent
+        if (
+            result is None
+            or not isinstance(result.get("score"), int)
+            or not isinstance(result.get("reason"), str)
+        ):
+            logger.error(f"AI Error: no usable score for {job.title} ({job.company})")
+            result = fallback
+        fits.append(result)
+    return fits
 
-def send_notification(job: JobListing, fit_data: dict):
-    webhook_url = os.getenv("DISCORD_WEBHOOK_URL")
-    if not webhook_url:
-        logger.warning("DISCORD_WEBHOOK_URL not set — skipping notification")
-        return
 
-    # Choose a color based on score: Green for 9-10, Yellow for 7-8
-    color = 5025616 if fit_data["score"] >= 9 else 16776960
+async def send_notification(
+    client: httpx.AsyncClient, job: JobListing, fit_data: dict
+):
+    if not DISCORD_WEBHOOK_URL:
+        return
 
-    base_url = "https://jrichwiltshire.github.io/Portfolio"
-    apply_url = f"{base_url}?id={job.external_id}"
+    color = COLOR_STRONG_FIT if fit_data["score"] >= 9 else COLOR_GOOD_FIT
+    apply_url = f"{DASHBOARD_URL}?id={job.external_id}"
 
     payload = {
         "embeds": [
@@ -222,51 +504,51 @@ def send_notification(job: JobListing, fit_data: dict):
         ],
     }
     try:
-        httpx.post(webhook_url, json=payload)
-    except Exception as e:
+        res = await client.post(
+            DISCORD_WEBHOOK_URL,
+            content=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"},
+            timeout=5.0,
+        )
+        res.raise_for_status()
+    except httpx.HTTPError as e:
         logger.error(f"Discord webhook failed: {e}")
 
 
-def is_duplicate(db, title, company):
-    """Fuzzy check for duplicate roles within the last 7 days."""
-    cursor = db.conn.cursor()
-
-    # Remove special chars and lowercase for a 'fuzzy' match
-    def clean(s):
-        return re.sub(r"[^a-zA-Z0-9]", "", s).lower()
-
-    cursor.execute(
-        "SELECT title, company FROM jobs WHERE posted_date > date('now', '-7 days')"
-    )
-    for row in cursor.fetchall():
-        if clean(title) == clean(row[0]) and clean(company) == clean(row[1]):
-            return True
-    return False
+# --- 4. FETCHERS ---
+def read_json(res: httpx.Response):
+    """Decodes a JSON response, failing fast on HTTP errors and non-JSON bodies (e.g. HTML error pages)."""
+    res.raise_for_status()
+    content_type = res.headers.get("Content-Type", "")
+    if "json" not in content_type:
+        raise ValueError(f"expected JSON from {res.url}, got {content_type or 'no content type'}")
+    return orjson.loads(res.content)
 
 
-# --- 4. FETCHERS ---
 # 0. Hacker News (API)
 async def fetch_hacker_news(client, keywords):
     """Uses Algolia API to search the latest 'Who is Hiring' thread."""
     logger.info("Searching Hacker News...")
     url = "https://hn.algolia.com/api/v1/search?tags=story,author_whoishiring&hitsPerPage=1"
     jobs = []
+    today = datetime.now().strftime("%Y-%m-%d")
     try:
         # 1. Find the latest thread
         res = await client.get(url)
-        hits = res.json().get("hits", [])
+        hits = read_json(res).get("hits", [])
         if not hits:
             return []
         thread_id = hits[0]["objectID"]
 
         # 2. Search comments for keywords (limit to first 3 to avoid spamming)
         search_url = f"https://hn.algolia.com/api/v1/search?tags=comment,story_{thread_id}&query="
-        for kw in keywords[:3]:
+
+        async def search_comments(kw):
+            jobs = []
             resp = await client.get(search_url + kw)
-            hits = resp.json().get("hits", [])
+            hits = read_json(resp).get("hits", [])
             for hit in hits:
                 comment = hit.get("comment_text", "")
-                sal_min, sal_max = extract_salary(comment)
                 jobs.append(
                     JobListing(
                         source="HackerNews",
@@ -276,11 +558,19 @@ async def fetch_hacker_news(client, keywords):
                         location="Remote/Hybrid",
                         link=f"https://news.ycombinator.com/item?id={hit['objectID']}",
                         description=comment,
-                        posted_date=datetime.now().strftime("%Y-%m-%d"),
-                        min_salary=sal_min,
-                        max_salary=sal_max,
+                        posted_date=today,
                     )
                 )
+            return jobs
+
+        results = await asyncio.gather(
+            *(search_comments(kw) for kw in keywords[:3]), return_exceptions=True
+        )
+        for kw, kw_jobs in zip(keywords[:3], results):
+            if isinstance(kw_jobs, Exception):
+                logger.error(f"HN ({kw}) failed: {kw_jobs}")
+                continue
+            jobs.extend(kw_jobs)
     except Exception as e:
         logger.error(f"HN failed: {e}")
     return jobs
@@ -291,15 +581,15 @@ async def fetch_arbeitnow(client, search_keywords):
     logger.info(f"Searching Arbeitnow for {search_keywords}...")
     url = "https://www.arbeitnow.com/api/job-board-api"
     jobs = []
+    matches_keyword = keyword_matcher(search_keywords)
+    today = datetime.now().strftime("%Y-%m-%d")
 
     # --- Source 1. Arbeitnow ---
     try:
         res = await client.get(url)
-        data = res.json().get("data", [])
+        data = read_json(res).get("data", [])
         for item in data:
-            title = item["title"].lower()
-            if any(k.lower() in title for k in search_keywords):
-                sal_min, sal_max = extract_salary(item["description"])
+            if matches_keyword(item["title"]):
                 jobs.append(
                     JobListing(
                         source="Arbeitnow",
@@ -309,11 +599,11 @@ async def fetch_arbeitnow(client, search_keywords):
                         location=item["location"],
                         link=item["url"],
                         description=item["description"],
-                        posted_date=datetime.now().strftime("%Y-%m-%d"),
-                        min_salary=sal_min,
-                        max_salary=sal_max,
+                        posted_date=today,
                     )
                 )
+                if len(jobs) >= MAX_PER_SOURCE:
+                    break
     except Exception as e:
         logger.error(f"Error fetching from Arbeitnow: {e}")
     return jobs
@@ -323,21 +613,18 @@ async def fetch_arbeitnow(client, search_keywords):
 async def fetch_remote_ok(client, keywords):
     """Fetcher for RemoteOK (Great for Data Science Roles)"""
     logger.info(f"Checking RemoteOK for {keywords}...")
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebkit/537.36"
-    }
     url = "https://remoteok.com/api"
     jobs = []
+    matches_keyword = keyword_matcher(keywords)
+    today = datetime.now().strftime("%Y-%m-%d")
 
     try:
-        res = await client.get(url, headers=headers)
-        data = res.json()
-
-        for item in data[1:]:
-            title = item.get("position", "").lower()
+        res = await client.get(url)
+        data = read_json(res)
 
-            if any(k.lower() in title for k in keywords):
-                sal_min, sal_max = extract_salary(item.get("description", ""))
+        # First element is RemoteOK's legal notice; skip it without copying the list
+        for item in islice(data, 1, None):
+            if matches_keyword(item.get("position", "")):
                 jobs.append(
                     JobListing(
                         source="RemoteOK",
@@ -347,11 +634,11 @@ async def fetch_remote_ok(client, keywords):
                         location="Remote",
                         link=item.get("url"),
                         description=item.get("description", ""),
-                        posted_date=datetime.now().strftime("%Y-%m-%d"),
-                        min_salary=sal_min,
-                        max_salary=sal_max,
+                        posted_date=today,
                     )
                 )
+                if len(jobs) >= MAX_PER_SOURCE:
+                    break
     except Exception as e:
         logger.error(f"Error fetching from RemoteOK: {e}")
     return jobs
@@ -361,11 +648,12 @@ async def fetch_remote_ok(client, keywords):
 async def fetch_remotive(client, keywords):
     url = "https://remotive.com/api/remote-jobs"
     jobs = []
+    matches_keyword = keyword_matcher(keywords)
     try:
         res = await client.get(url)
-        data = res.json().get("jobs", [])
+        data = read_json(res).get("jobs", [])
         for item in data:
-            if any(k.lower() in item["title"].lower() for k in keywords):
+            if matches_keyword(item["title"]):
                 jobs.append(
                     JobListing(
                         source="Remotive",
@@ -389,13 +677,16 @@ async def fetch_wwr(client, keywords):
         "https://weworkremotely.com/categories/remote-back-end-programming-jobs.rss",
         "https://weworkremotely.com/categories/remote-data-science-jobs.rss",
     ]
-    jobs = []
-    try:
-        for feed_url in feeds:
+    matches_keyword = keyword_matcher(keywords)
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    async def fetch_feed(feed_url):
+        jobs = []
+        try:
             res = await client.get(feed_url)
             feed = feedparser.parse(res.text)
             for entry in feed.entries:
-                if any(k.lower() in entry.title.lower() for k in keywords):
+                if matches_keyword(entry.title):
                     jobs.append(
                         JobListing(
                             source="WeWorkRemotely",
@@ -405,23 +696,29 @@ async def fetch_wwr(client, keywords):
                             location="Remote",
                             link=entry.link,
                             description=entry.summary,
-                            posted_date=datetime.now().strftime("%Y-%m-%d"),
+                            posted_date=today,
                         )
                     )
-    except Exception as e:
-        logger.error(f"WWR failed: {e}")
-    return jobs
+        except Exception as e:
+            logger.error(f"WWR failed: {e}")
+        return jobs
+
+    # Feeds are independent, so fetch them concurrently
+    results = await asyncio.gather(*(fetch_feed(url) for url in feeds))
+    return [job for feed_jobs in results for job in feed_jobs]
 
 
 # 5. Jobspresso
 async def fetch_jobespresso(client, keywords):
     url = "https://jobspresso.co/feed/"
     jobs = []
+    matches_keyword = keyword_matcher(keywords)
+    today = datetime.now().strftime("%Y-%m-%d")
     try:
         res = await client.get(url)
         feed = feedparser.parse(res.text)
         for entry in feed.entries:
-            if any(k.lower() in entry.title.lower() for k in keywords):
+            if matches_keyword(entry.title):
                 jobs.append(
                     JobListing(
                         source="Jobspresso",
@@ -431,7 +728,7 @@ async def fetch_jobespresso(client, keywords):
                         location="Remote",
                         link=entry.link,
                         description=entry.summary,
-                        posted_date=datetime.now().strftime("%Y-%m-%d"),
+                        posted_date=today,
                     )
                 )
     except Exception as e:
@@ -443,44 +740,50 @@ async def fetch_jobespresso(client, keywords):
 async def fetch_built_in_austin(client, keywords, city="austin"):
     """Fetcher for Built In Austin (Scraping/API hybrid approach)"""
     categories = ["data-analytics", "business-intelligence"]
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-    }
-    jobs = []
+    matches_keyword = keyword_matcher(keywords)
+    today = datetime.now().strftime("%Y-%m-%d")
 
-    for cat in categories:
+    async def fetch_category(cat):
         logger.info(f"Checking Built In Austin: {cat}...")
         url = f"https://www.builtinaustin.com/jobs/{cat}"
+        jobs = []
 
         try:
-            res = await client.get(url, headers=headers)
-            soup = BeautifulSoup(res.text, "lxml")
+            res = await client.get(url)
+            res.raise_for_status()
+            if len(res.content) > MAX_HTML_BYTES:
+                raise ValueError(f"page is {len(res.content)} bytes, skipping")
+            # Lexbor parses in C and only wraps the nodes we actually select
+            tree = LexborHTMLParser(res.text)
 
-            job_cards = soup.select('div[data-id="job-card"]')
-            for card in job_cards:
-                title_el = card.select_one("h2")
-                company_el = card.select_one("div.company-name")
-                link_el = card.select_one('a[data-id="job-card-title"]')
+            for card in tree.css('div[data-id="job-card"]'):
+                title_el = card.css_first("h2")
+                company_el = card.css_first("div.company-name")
+                link_el = card.css_first('a[data-id="job-card-title"]')
 
                 if title_el and company_el and link_el:
-                    title = title_el.text.strip()
-                    if any(k.lower() in title.lower() for k in keywords):
-                        link = "https://www.builtinaustin.com" + link_el["href"]
+                    title = title_el.text().strip()
+                    if matches_keyword(title):
+                        link = "https://www.builtinaustin.com" + link_el.attributes["href"]
                         jobs.append(
                             JobListing(
                                 source="BuiltInAustin",
-                                external_id=f"bia-{hash(link)}",
+                                # hash() is salted per process, so it can't key rows across runs
+                                external_id=f"bia-{hashlib.blake2b(link.encode(), digest_size=8).hexdigest()}",
                                 title=title,
-                                company=company_el.text.strip(),
+                                company=company_el.text().strip(),
                                 location="Austin, TX",
                                 link=link,
                                 description="Visit link for full description...",
-                                posted_date=datetime.now().strftime("%Y-%m-%d"),
+                                posted_date=today,
                             )
                         )
         except Exception as e:
             logger.error(f"BuiltIn ({cat}) failed: {e}")
-    return jobs
+        return jobs
+
+    results = await asyncio.gather(*(fetch_category(cat) for cat in categories))
+    return [job for cat_jobs in results for job in cat_jobs]
 
 
 # 7. Adzuna (API)
@@ -496,7 +799,7 @@ async def fetch_adzuna(client, keywords):
 
     try:
         res = await client.get(url)
-        data = res.json().get("results", [])
+        data = read_json(res).get("results", [])
         for item in data:
             jobs.append(
                 JobListing(
@@ -520,20 +823,22 @@ async def fetch_adzuna(client, keywords):
 # 8. Greenhouse Boards (Direct)
 async def fetch_greenhouse_companies(client, keywords, companies):
     """Fetcher for companies using Greenhouse (e.g., DoorDash, Stripe, etc.)"""
-    jobs = []
+    matches_keyword = keyword_matcher(keywords)
+    today = datetime.now().strftime("%Y-%m-%d")
 
-    for co in companies:
+    async def fetch_board(co):
         logger.info(f"Checking Greenhouse board for {co}...")
         url = f"https://boards-api.greenhouse.io/v1/boards/{co}/jobs?content=true"
+        jobs = []
         try:
             res = await client.get(url)
-            data = res.json().get("jobs", [])
+            data = read_json(res).get("jobs", [])
             for item in data:
                 title = item["title"]
 
-                if any(k.lower() in title.lower() for k in keywords):
+                if matches_keyword(title):
                     raw_html = item.get("content", "")
-                    description = BeautifulSoup(raw_html, "lxml").get_text(separator=" ", strip=True)[:2000] if raw_html else ""
+                    description = LexborHTMLParser(raw_html).text(separator=" ", strip=True)[:2000] if raw_html else ""
                     jobs.append(
                         JobListing(
                             source=f"Greehouse-{co}",
@@ -543,57 +848,72 @@ async def fetch_greenhouse_companies(client, keywords, companies):
                             location=item.get("location", {}).get("name", ""),
                             link=item["absolute_url"],
                             description=description,
-                            posted_date=datetime.now().strftime("%Y-%m-%d"),
+                            posted_date=today,
                         )
                     )
         except:
             pass
-    return jobs
+        return jobs
+
+    # One request per board, all in flight at once
+    results = await asyncio.gather(*(fetch_board(co) for co in companies))
+    return [job for board_jobs in results for job in board_jobs]
 
 
 # 9. Lever Boards (Direct Scraper)
 async def fetch_lever(client, keywords, companies):
-    jobs = []
-    for co in companies:
+    matches_keyword = keyword_matcher(keywords)
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    async def fetch_board(co):
+        jobs = []
         url = f"https://jobs.lever.co/{co}"
         try:
             res = await client.get(url)
-            soup = BeautifulSoup(res.text, "lxml")
-            postings = soup.select(".posting")
+            tree = LexborHTMLParser(res.text)
+            postings = tree.css(".posting")
             for post in postings:
-                title = post.select_one("h5").text
-                if any(k.lower() in title.lower() for k in keywords):
-                    link = post.select_one("a.posting-title")["href"]
+                title = post.css_first("h5").text()
+                if matches_keyword(title):
+                    link = post.css_first("a.posting-title").attributes["href"]
                     jobs.append(
                         JobListing(
                             source=f"Lever-{co}",
-                            external_id=f"lev-{hash(link)}",
+                            # Lever links end in the posting's UUID, which is stable across runs
+                            external_id=f"lev-{link.rstrip('/').rsplit('/', 1)[-1]}",
                             title=title,
                             company=co.capitalize(),
                             location="Remote/Hybrid",
                             link=link,
                             description="See Lever link",
-                            posted_date=datetime.now().strftime("%Y-%m-%d"),
+                            posted_date=today,
                         )
                     )
         except:
             pass
-    return jobs
+        return jobs
+
+    # One request per board, all in flight at once
+    results = await asyncio.gather(*(fetch_board(co) for co in companies))
+    return [job for board_jobs in results for job in board_jobs]
 
 
 # 10. Ashby Boards (Direct API-ish)
 async def fetch_ashby(client, keywords, companies):
-    jobs = []
-    for co in companies:
+    matches_keyword = keyword_matcher(keywords)
+    today = datetime.now().strftime("%Y-%m-%d")
+
+    async def fetch_board(co):
+        jobs = []
         url = f"https://api.ashbyhq.com/posting-api/job-board/{co}"
         try:
             res = await client.get(url)
-            data = res.json().get("jobs", [])
+            data = read_json(res).get("jobs", [])
             for item in data:
                 title = item["title"]
-                if any(k.lower() in title.lower() for k in keywords):
+                if matches_keyword(title):
                     raw_html = item.get("descriptionHtml", "")
-                    description = BeautifulSoup(raw_html, "lxml").get_text(separator=" ", strip=True)[:2000] if raw_html else ""
+                    description = LexborHTMLParser(raw_html).text(separator=" ", strip=True)[:2000] if raw_html else ""
                     jobs.append(
                         JobListing(
                             source=f"Ashby-{co}",
@@ -603,13 +923,17 @@ async def fetch_ashby(client, keywords, companies):
                             location=item.get("location", ""),
                             link=item["jobUrl"],
                             description=description,
-                            posted_date=datetime.now().strftime("%Y-%m-%d"),
+                            posted_date=today,
                         )
                     )
 
         except:
             pass
-    return jobs
+        return jobs
+
+    # One request per board, all in flight at once
+    results = await asyncio.gather(*(fetch_board(co) for co in companies))
+    return [job for board_jobs in results for job in board_jobs]
 
 
 # 11. Y Combinator (Work at a Startup)
@@ -618,14 +942,14 @@ async def fetch_yc(client, keywords):
     logger.info("Searching Y Combinator...")
     # Corrected Algolia host and API key
     url = "https://zgob769v03.algolia.net/1/indexes/jobs_prod/query?x-algolia-api-key=de064d6690696ca00600000000000000&x-algolia-application-id=ZGOB769V03"
-    jobs = []
+    today = datetime.now().strftime("%Y-%m-%d")
 
-    # We'll search for each keyword
-    for kw in keywords[:3]:
+    async def search_keyword(kw):
+        jobs = []
         payload = {"query": kw, "hitsPerPage": 20, "filters": "jobType:full_time"}
         try:
             res = await client.post(url, json=payload)
-            hits = res.json().get("hits", [])
+            hits = read_json(res).get("hits", [])
             for hit in hits:
                 jobs.append(
                     JobListing(
@@ -636,14 +960,18 @@ async def fetch_yc(client, keywords):
                         location=hit.get("location", "Remote/Hybrid"),
                         link=f"https://www.workatastartup.com/jobs/{hit['id']}",
                         description=hit.get("description", ""),
-                        posted_date=datetime.now().strftime("%Y-%m-%d"),
+                        posted_date=today,
                         min_salary=hit.get("minSalary"),
                         max_salary=hit.get("maxSalary"),
                     )
                 )
         except Exception as e:
             logger.error(f"YC ({kw}) failed: {e}")
-    return jobs
+        return jobs
+
+    # One search per keyword, all in flight at once
+    results = await asyncio.gather(*(search_keyword(kw) for kw in keywords[:3]))
+    return [job for kw_jobs in results for job in kw_jobs]
 
 
 # 12. Google Jobs (via SearchApi - aggregates LinkedIn/Indeed)
@@ -654,13 +982,14 @@ async def fetch_google_jobs(client, keywords):
 
     logger.info("Searching Google Jobs (LinkedIn/Indeed aggregator)...")
     jobs = []
+    today = datetime.now().strftime("%Y-%m-%d")
     # Use your most important keyword for this high-value search
     query = f"{keywords[0]} in Austin"
     url = f"https://www.searchapi.io/api/v1/search?engine=google_jobs&q={query}&api_key={api_key}"
 
     try:
         res = await client.get(url)
-        results = res.json().get("jobs_results", [])
+        results = read_json(res).get("jobs_results", [])
         for item in results:
             jobs.append(
                 JobListing(
@@ -675,7 +1004,7 @@ async def fetch_google_jobs(client, keywords):
                         else ""
                     ),
                     description=item.get("description", ""),
-                    posted_date=datetime.now().strftime("%Y-%m-%d"),
+                    posted_date=today,
                 )
             )
     except Exception as e:
@@ -716,7 +1045,25 @@ async def main():
 
     logger.info("Starting Async Job Search...")
 
-    async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
+    # One pooled client for every fetcher and the Discord webhook: keep-alive
+    # connections are reused across requests to the same host, and connect
+    # failures are retried. HTTP/2 multiplexes the per-company board calls over
+    # one connection per host. Pool settings live on the transport because
+    # httpx ignores the client's http2/limits once a transport is passed.
+    async with httpx.AsyncClient(
+        timeout=httpx.Timeout(10.0, connect=5.0),
+        follow_redirects=True,
+        headers={"User-Agent": USER_AGENT},
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=50,
+                keepalive_expiry=30,
+            ),
+            retries=3,
+        ),
+    ) as client:
         # Launch standard fetchers in parallel
         tasks = [
             fetch_hacker_news(client, keywords),
@@ -738,49 +1085,116 @@ async def main():
         else:
             logger.info("Skipping Google Jobs today (Scheduled for Sunday only).")
 
-        results = await asyncio.gather(*tasks)
-
-    # Flatten list
-    all_jobs = [job for sublist in results for job in sublist]
-    logger.info(f"Fetched {len(all_jobs)} total jobs. Filtering & Scoring...")
-
-    _LOCATION_WHITELIST = [
-        "remote", "hybrid", "austin", "texas",
-        "anywhere", "worldwide", "united states", "usa",
-        "us only", "north america", "us-based", "us based",
-    ]
-
-    def is_location_relevant(location: str) -> bool:
-        if not location:
-            return True
-        return any(kw in location.lower() for kw in _LOCATION_WHITELIST)
-
-    # 2 concurrent + 3s sleep = ~24 RPM, safely under Groq free tier (30 RPM)
-    ai_semaphore = asyncio.BoundedSemaphore(2)
-
-    async def score_and_notify(job):
-        if not is_location_relevant(job.location):
-            return False
-        if not db.job_exists(job.external_id) and not is_duplicate(
-            db, job.title, job.company
-        ):
-            async with ai_semaphore:
-                fit = await calculate_fit_score(job, MY_RESUME)
-                await asyncio.sleep(3)
+        # A crashing fetcher shouldn't take the rest of the run down with it
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Flatten list
+        all_jobs = []
+        for sublist in results:
+            if isinstance(sublist, Exception):
+                logger.error(f"Fetcher failed: {sublist}")
+                continue
+            all_jobs.extend(sublist)
+        logger.info(f"Fetched {len(all_jobs)} total jobs. Filtering & Scoring...")
+
+        # Per-keyword searches (HN, YC) and overlapping feeds return the same
+        # posting more than once; keep the first copy so each is scored once
+        seen_ids = set()
+        unique_jobs = []
+        for job in all_jobs:
+            if job.external_id not in seen_ids:
+                seen_ids.add(job.external_id)
+                unique_jobs.append(job)
+
+        # One lookup each for the whole batch instead of SELECTs per job
+        known_ids = db.known_ids(seen_ids)
+        job_keys = [norm_key(job.title, job.company) for job in unique_jobs]
+        seen_keys = db.recent_norm_keys(job_keys)
+
+        # Pace request starts instead of sleeping while holding a slot, so slow
+        # responses overlap rather than eating into the rate budget
+        ai_semaphore = asyncio.BoundedSemaphore(AI_MAX_CONCURRENCY)
+        ai_throttle = RateLimiter(AI_MIN_INTERVAL)
+        discord_throttle = RateLimiter(DISCORD_MIN_INTERVAL)
+        if not DISCORD_WEBHOOK_URL:
+            logger.warning("DISCORD_WEBHOOK_URL not set — skipping notifications")
+
+        async def notify(job, fit):
+            if not DISCORD_WEBHOOK_URL:
+                return
+            await discord_throttle.wait()
+            await send_notification(client, job, fit)
+
+        matches = []
+        new_fits = []  # Written to fit_cache in one transaction after scoring
+
+        async def record_match(job, fit):
             if fit["score"] >= 7:
+                # Only stored matches need a salary, so the regex skips
+                # everything dedup and scoring threw away
+                if job.min_salary is None and job.max_salary is None:
+                    job.min_salary, job.max_salary = extract_salary(job.description)
                 job.why_me = fit.get("why_me")
-                db.upsert_job(job)
-                send_notification(job, fit)
+                job.score = fit["score"]
+                job.reason = fit.get("reason")
+                matches.append(job)
+                await notify(job, fit)
                 logger.info(f"MATCH: {job.title} ({fit['score']}/10)")
-                return True
-        return False
 
-    # Run scoring tasks in parallel
-    scoring_tasks = [score_and_notify(job) for job in all_jobs]
-    results = await asyncio.gather(*scoring_tasks)
-    new_count = sum(1 for r in results if r)
+        cached = []
+        to_score = []  # (job, description, cache_key) for jobs that still need an AI call
+        for job, key in zip(unique_jobs, job_keys):
+            if not is_location_relevant(job.location):
+                continue
+            if job.external_id in known_ids:
+                continue
+            if job.source not in NORM_KEY_EXEMPT_SOURCES:
+                if key in seen_keys:
+                    continue
+                # The same role cross-posted under different IDs is only scored once
+                seen_keys.add(key)
+            # Markup is stripped once here and reused for the cache key and the prompt
+            description = prompt_text(job.description)
+            # Cross-posted roles and reruns reuse the earlier score instead of
+            # paying for another AI call
+            cache_key = fit_cache_key(job, description, RESUME_SNIPPET)
+            fit = db.get_cached_fit(cache_key)
+            if fit is not None:
+                cached.append(record_match(job, fit))
+            else:
+                to_score.append((job, description, cache_key))
+
+        async def score_batch(batch):
+            descriptions = [description for _, description, _ in batch]
+            tokens = estimate_batch_tokens(descriptions, RESUME_SNIPPET)
+            async with ai_semaphore:
+                await ai_throttle.wait(60 * tokens / AI_TOKENS_PER_MINUTE)
+                fits = await calculate_fit_scores_batch(
+                    [job for job, _, _ in batch], descriptions, RESUME_SNIPPET
+                )
+            for (job, _, cache_key), fit in zip(batch, fits):
+                if fit.get("reason") != AI_FALLBACK_REASON:
+                    new_fits.append((cache_key, fit))
+            await asyncio.gather(
+                *(record_match(job, fit) for (job, _, _), fit in zip(batch, fits))
+            )
+
+        # Run scoring batches in parallel; a failing batch is logged rather than
+        # raised so the matches already found (and notified) are still stored
+        results = await asyncio.gather(
+            *cached,
+            *(score_batch(batch) for batch in batched(to_score, AI_BATCH_SIZE)),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Scoring failed: {result}")
+
+    # Single transaction per table rather than a commit per job
+    db.upsert_jobs(matches)
+    db.cache_fits(new_fits)
 
-    logger.info(f"Done. Found {new_count} new relevant jobs.")
+    logger.info(f"Done. Found {len(matches)} new relevant jobs.")
 
 
 # --- 3. THE "WORKER" (MAIN EXECUTION) ---
@@ -1,11 +1,21 @@
 import streamlit as st
 import pandas as pd
 import folium
-from streamlit_folium import st_folium
+from folium.plugins import FastMarkerCluster
+from folium.utilities import camelize
+import json
 import sqlite3
-import re
+import os
+import threading
+import time
+from functools import partial
+from string import Template
+from geopy.adapters import RequestsAdapter
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+from geopy.exc import GeopyError
+from geopy.extra.rate_limiter import RateLimiter
+
+from db_utils import has_check_constraints, upgrade_schema
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -17,175 +27,304 @@ st.set_page_config(
 # --- Database Configuration ---
 DATABASE_PATH = "data/travel_map.db"
 
+# --- Map Configuration ---
+_POPUP_TEMPLATE = Template(
+    '<h3>$name</h3><img src="$url" alt="$name" style="width:200px;height:auto;">'
+)
+_POPUP_MAX_WIDTH = 300
+_MARKER_STYLE = dict(radius=8, color="blue", fill=True, fill_color="blue")
+
+# Above this many markers, points are sent as one JS array and clustered in the browser
+FAST_MARKER_THRESHOLD = 200
+# Builds the same circle marker, popup and tooltip as the Python path for each
+# [latitude, longitude, location_name, popup_html] row; the options come from
+# _MARKER_STYLE (in Leaflet's camelCase) and the popups from _POPUP_TEMPLATE
+FAST_MARKER_CALLBACK = f"""
+function (row) {{
+    var marker = L.circleMarker(
+        new L.LatLng(row[0], row[1]),
+        {json.dumps({camelize(key): value for key, value in _MARKER_STYLE.items()})}
+    );
+    marker.bindPopup(row[3], {json.dumps({"maxWidth": _POPUP_MAX_WIDTH})});
+    marker.bindTooltip(row[2]);
+    return marker;
+}}
+"""
+
 # --- Geocoding Configuration ---
 GEO_USER_AGENT = "TravelPhotoMap"
-geolocator = Nominatim(user_agent=GEO_USER_AGENT, timeout=10)
+
+
+@st.cache_resource
+def get_geocoder():
+    """Builds the paced Nominatim geocode function once, so its session and rate limit survive reruns."""
+    # Pin the requests-backed adapter (geopy falls back to urllib without
+    # keep-alive if requests is missing); Nominatim is one host, so one pooled
+    # connection is reused for every lookup. Lookups block the first render, so
+    # each gets one short attempt: failures aren't cached and are retried on
+    # the next rerun anyway
+    geolocator = Nominatim(
+        user_agent=GEO_USER_AGENT,
+        timeout=3,
+        adapter_factory=partial(
+            RequestsAdapter, pool_connections=1, pool_maxsize=1, max_retries=0
+        ),
+    )
+    # Nominatim's usage policy allows one request per second; errors still
+    # raise so callers can report them
+    return RateLimiter(
+        geolocator.geocode,
+        min_delay_seconds=1.0,
+        max_retries=0,
+        swallow_exceptions=False,
+    )
+
+
+@st.cache_resource
+def get_connection():
+    """Opens one SQLite connection that is reused across reruns and sessions."""
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
+    # Rollback journal rather than WAL: data/travel_map.db is tracked in git and
+    # this connection is never closed, so WAL commits could sit in an untracked
+    # -wal file while the tracked file looks unchanged. Setting it explicitly also
+    # converts a copy an earlier version switched to WAL
+    conn.execute("PRAGMA journal_mode=DELETE")
+    upgrade_schema(conn)
+    return conn
+
+
+@st.cache_resource
+def get_write_lock():
+    """Serializes writes on the shared connection across Streamlit sessions."""
+    return threading.Lock()
 
 
 # temporary code for testing
-def execute_sql_command(sql):
-    """Executes a SQL command on the database (for testing only)."""
-    conn = sqlite3.connect(DATABASE_PATH)
+def insert_sample_data(locations, photos):
+    """Inserts (name, latitude, longitude) locations and (name, url) photos in one transaction (for testing only).
+
+    Rows that already exist are skipped, so running it twice doesn't duplicate anything.
+    """
+    conn = get_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute(sql)
-        conn.commit()
-        print(f"SQL command executed successfully: {sql}")
+        with get_write_lock(), conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO locations (location_name, latitude, longitude) VALUES (?, ?, ?)",
+                locations,
+            )
+            # Photos reference their location by name, so ids don't have to be guessed
+            conn.executemany(
+                """
+                INSERT INTO photos (location_id, photo_url)
+                SELECT l.id, ? FROM locations l
+                WHERE l.location_name = ? AND NOT EXISTS (
+                    SELECT 1 FROM photos p WHERE p.location_id = l.id AND p.photo_url = ?
+                )
+                """,
+                [
+                    (photo_url, location_name, photo_url)
+                    for location_name, photo_url in photos
+                ],
+            )
+        get_data_from_db.clear()
+        print(f"Inserted {len(locations)} sample locations and {len(photos)} photos.")
     except sqlite3.Error as e:
-        print(f"Error executing SQL command: {e}")
-    finally:
-        conn.close()
+        print(f"Error inserting sample data: {e}")
 
 
-def get_data_from_db():
-    """Retrieves location and photo data from the database."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    try:
-        df_locations = pd.read_sql_query("SELECT * FROM locations", conn)
-        df_photos = pd.read_sql_query("SELECT * FROM photos", conn)
+def db_version():
+    """Changes whenever the database is written."""
+    return os.stat(DATABASE_PATH).st_mtime_ns if os.path.exists(DATABASE_PATH) else None
+
 
-        # Merge the dataframes on location_id
-        # df = pd.merge(df_locations, df_photos, left_on="id", right_on="location_id", how="left")
-        return df_locations, df_photos
+@st.cache_data(ttl=60, show_spinner=False)
+def get_data_from_db(db_version):
+    """Retrieves each location joined with its photos (one row per photo, or one with no photo).
+
+    db_version is only part of the cache key, so writes from other processes
+    invalidate the cached frame.
+    """
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(
+            """
+            SELECT l.id, l.location_name, l.latitude, l.longitude, p.photo_url
+            FROM locations l
+            LEFT JOIN photos p ON p.location_id = l.id
+            ORDER BY l.id, p.id
+            """,
+            conn,
+            # float32 is far more precision than city-level markers need
+            dtype={"latitude": "float32", "longitude": "float32"},
+        )
     except Exception as e:
         print(f"Error fetching data from database: {e}")
-        return pd.DataFrame(), pd.DataFrame()
-    finally:
-        conn.close()
+        return pd.DataFrame()
 
 
-def is_valid_url(url):
-    """Checks if a URL is valid."""
-    regex = re.compile(
-        r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
-    )
-    return bool(re.match(regex, url))
+_URL_SCHEMES = ("http://", "https://")
+_MAX_URL_LENGTH = 2048
 
 
-def geocode_location(location_name):
-    """Geocodes a location name to latitude and longitude."""
-    try:
-        location = geolocator.geocode(location_name)
-        if location:
-            return location.latitude, location.longitude
-        else:
-            st.error(f"Could not geocode location: {location_name}")
-            return None, None
-    except GeocoderTimedOut as e:
-        st.error(f"Geocoding timed out for location: {location_name}")
-        return None, None
-    except GeocoderServiceError as e:
-        st.error(f"Geocoding service error: {e}")
-        return None, None
-    except Exception as e:
-        st.error(f"An unexpected error occurred during geocoding: {e}")
-        return None, None
+# st.cache_data rather than lru_cache: Streamlit re-executes this module on
+# every rerun, which would start a fresh lru_cache each time
+@st.cache_data(max_entries=4096, show_spinner=False)
+def geocode_cached(name):
+    """Looks up a normalized name in geocode_cache, falling back to Nominatim.
+
+    Raises LookupError when Nominatim has no match. Failures raise rather than
+    return, so they are never cached.
+    """
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT lat, lon FROM geocode_cache WHERE name = ?", (name,)
+    ).fetchone()
+    if row:
+        return row
+    location = get_geocoder()(name)
+    if not location:
+        raise LookupError(name)
+    with get_write_lock(), conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO geocode_cache (name, lat, lon, ts) VALUES (?, ?, ?, ?)",
+            (name, location.latitude, location.longitude, int(time.time())),
+        )
+    return location.latitude, location.longitude
+
+
+def geocode_many(location_names):
+    """Geocodes names in order, returning (lat, lon), or (None, None) on failure, for each.
+
+    Cache misses go out one at a time at Nominatim's permitted rate, and failures
+    are reported in a single warning instead of one error per name.
+    """
+    coords = []
+    failed = []
+    for location_name in location_names:
+        try:
+            coords.append(geocode_cached(location_name.strip().lower()))
+        except (LookupError, GeopyError):
+            coords.append((None, None))
+            failed.append(location_name)
+    if failed:
+        st.warning(f"Could not geocode: {'; '.join(failed)}")
+    return coords
+
+
+@st.cache_data(show_spinner=False)
+def build_map_html(markers):
+    """Renders the map to HTML once per distinct set of markers, so reruns reuse it."""
+    return build_map(markers).get_root().render()
+
+
+def build_map(markers):
+    """Builds a folium map with one circle marker per (name, latitude, longitude, photo_url)."""
+    # Create a folium map centered on the first location
+    m = folium.Map(location=[markers[0][1], markers[0][2]], zoom_start=4)
+
+    if len(markers) > FAST_MARKER_THRESHOLD:
+        FastMarkerCluster(
+            data=[
+                [lat, lon, name, _POPUP_TEMPLATE.substitute(name=name, url=photo_url)]
+                for name, lat, lon, photo_url in markers
+            ],
+            callback=FAST_MARKER_CALLBACK,
+            name="photos",
+        ).add_to(m)
+        return m
+
+    # Markers go into one layer group that is added to the map once
+    photo_layer = folium.FeatureGroup(name="photos").add_to(m)
+
+    # Add markers for each location
+    for location_name, latitude, longitude, photo_url in markers:
+        # Create the popup HTML with the location name and photo
+        popup_html = _POPUP_TEMPLATE.substitute(name=location_name, url=photo_url)
+
+        folium.CircleMarker(
+            location=(latitude, longitude),
+            popup=folium.Popup(popup_html, max_width=_POPUP_MAX_WIDTH),
+            tooltip=location_name,
+            **_MARKER_STYLE,
+        ).add_to(photo_layer)
+
+    return m
 
 
 # --- Main Application ---
 st.title("Our Travel Photo Map")
 
 # Get data from the database
-df_locations, df_photos = get_data_from_db()
+df = get_data_from_db(db_version())
 
 # Insert initial data (TEMPORARY - FOR TESTING ONLY)
-if df_locations.empty:
-    # Example address to geocode
-    austin_coords = geocode_location("Austin, Texas")
-    if austin_coords:
-        execute_sql_command(
-            f"""
-            INSERT INTO locations (location_name, latitude, longitude)
-            VALUES ('Austin', {austin_coords[0]}, {austin_coords[1]})
-            """
-        )
-    else:
-        execute_sql_command(
-            """
-            INSERT INTO locations (location_name, latitude, longitude)
-            VALUES ('Austin', 30.2672, -97.7431)
-            """
-        )
-        execute_sql_command(
-            """
-            INSERT INTO locations (location_name, latitude, longitude)
-            VALUES ('Austin', 30.2672, -97.7431),
-                ('New York', 40.7128, -74.0060),
-                ('San Francisco', 37.7749, -122.4194)
-            """
-        )
-    execute_sql_command(
-        """
-        INSERT INTO photos (location_id, photo_url)
-        VALUES (1, 'https://content.r9cdn.net/rimg/dimg/15/27/c7e81fad-city-22863-177642838c4.jpg?width=1366&height=768&xhint=3008&yhint=1481&crop=true'),
-               (2, 'https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQzUqME3_q2Nh5I-PMBL7vMA8paL61l4XS-8Q&s'),
-               (3, 'https://media.istockphoto.com/id/1136437406/photo/san-francisco-skyline-with-oakland-bay-bridge-at-sunset-california-usa.jpg?s=612x612&w=0&k=20&c=JVBBZT2uquZbfY0njYHv8vkLfatoM4COJc-lX5QKYpE=')"""
+if df.empty:
+    # Example addresses to geocode, with hardcoded fallbacks
+    samples = [
+        ("Austin", "Austin, Texas", 30.2672, -97.7431),
+        ("New York", "New York, New York", 40.7128, -74.0060),
+        ("San Francisco", "San Francisco, California", 37.7749, -122.4194),
+    ]
+    geocoded = geocode_many([address for _, address, _, _ in samples])
+    insert_sample_data(
+        [
+            (name, lat, lon) if lat is not None else (name, fallback_lat, fallback_lon)
+            for (name, _, fallback_lat, fallback_lon), (lat, lon) in zip(
+                samples, geocoded
+            )
+        ],
+        [
+            ("Austin", "https://content.r9cdn.net/rimg/dimg/15/27/c7e81fad-city-22863-177642838c4.jpg?width=1366&height=768&xhint=3008&yhint=1481&crop=true"),
+            ("New York", "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcQzUqME3_q2Nh5I-PMBL7vMA8paL61l4XS-8Q&s"),
+            ("San Francisco", "https://media.istockphoto.com/id/1136437406/photo/san-francisco-skyline-with-oakland-bay-bridge-at-sunset-california-usa.jpg?s=612x612&w=0&k=20&c=JVBBZT2uquZbfY0njYHv8vkLfatoM4COJc-lX5QKYpE="),
+        ],
     )
-    df_locations, df_photos = get_data_from_db()
+    df = get_data_from_db(db_version())
 
 # Check if data is available
-if df_locations.empty:
+if df.empty:
     st.warning("No location data found in the database. Please add locations.")
 else:
-    # Validate data before displaying
-    valid_locations = []
-    for index, row in df_locations.iterrows():
-        if -90 <= row["latitude"] <= 90 and -180 <= row["longitude"] <= 180:
-            valid_locations.append(row)
-        else:
+    df_valid = df
+    # Databases created before the CHECK constraints still need validating on read;
+    # only the rejected rows are looped over
+    if not has_check_constraints(get_connection()):
+        coords_ok = df["latitude"].between(-90, 90) & df["longitude"].between(-180, 180)
+        for location_name in df.loc[~coords_ok, "location_name"].unique():
             st.error(
-                f"Invalid coordinates for location: {row['location_name']}. Skipping this location."
+                f"Invalid coordinates for location: {location_name}. Skipping this location."
             )
 
-    valid_photos = []
-    for index, row in df_photos.iterrows():
-        if is_valid_url(row["photo_url"]):
-            valid_photos.append(row)
-        else:
-            st.error(f"Invalid URL: {row['photo_url']}. Skipping this photo.")
+        urls = df["photo_url"]
+        url_ok = (
+            urls.str.startswith(_URL_SCHEMES, na=False)
+            & ~urls.str.contains(" ", regex=False, na=True)
+            & (urls.str.len() < _MAX_URL_LENGTH)
+        )
+        for photo_url in df.loc[df["photo_url"].notna() & ~url_ok, "photo_url"]:
+            st.error(f"Invalid URL: {photo_url}. Skipping this photo.")
+
+        df_valid = df[coords_ok].assign(photo_url=df["photo_url"].where(url_ok))
 
-    df_locations = pd.DataFrame(valid_locations)
-    df_photos = pd.DataFrame(valid_photos)
+    # One row per valid location with its first valid photo; first() skips
+    # the invalid URLs blanked out above
+    df_locations = (
+        df_valid
+        .groupby("id", sort=False)
+        .first()
+        .fillna({"photo_url": ""})
+    )
 
     if not df_locations.empty:
-        # Create a folium map centered on the first location
-        m = folium.Map(
-            location=[
-                df_locations["latitude"].iloc[0],
-                df_locations["longitude"].iloc[0],
-            ],
-            zoom_start=4,
+        # One (name, latitude, longitude, photo_url) tuple per location
+        markers = tuple(
+            df_locations[
+                ["location_name", "latitude", "longitude", "photo_url"]
+            ].itertuples(index=False, name=None)
         )
 
-        # Add markers for each location
-        for index, row in df_locations.iterrows():
-            # Find the photo URL
-            photo_url = (
-                df_photos[df_photos["location_id"] == row["id"]]["photo_url"].iloc[0]
-                if not df_photos.empty
-                and not df_photos[df_photos["location_id"] == row["id"]].empty
-                else ""
-            )
-
-            # Create the popup HTML with the location name and photo
-            popup_html = f"""
-            <h3>{row["location_name"]}</h3>
-            <img src={photo_url} alt="{row["location_name"]}" style="width:200px;height:auto;">
-            """
-            popup = folium.Popup(popup_html, max_width=300)
-
-            folium.CircleMarker(
-                location=[row["latitude"], row["longitude"]],
-                radius=8,
-                color="blue",
-                fill=True,
-                fill_color="blue",
-                popup=popup,
-                tooltip=row["location_name"],
-            ).add_to(m)
-
         # Display the map in Streamlit
-        st_folium(m, width=700, height=500)
+        st.iframe(build_map_html(markers), width=700, height=500)
     else:
         st.warning(
             "No valid locations found in the database. Please add valid locations."
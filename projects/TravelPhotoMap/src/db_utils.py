@@ -12,6 +12,34 @@ def create_connection():
         print(f"Error connecting to database: {e}")
     return conn
 
+def upgrade_schema(conn):
+    """Adds the tables and indexes introduced after the original schema; safe to run on every connection."""
+    # Geocoding results cached by normalized location name
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS geocode_cache (
+            name TEXT PRIMARY KEY,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            ts INTEGER
+        )
+    """)
+    # Lets the locations/photos join find each location's photos without a scan;
+    # skipped until create_tables has made the photos table
+    has_photos = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'photos'"
+    ).fetchone()
+    if has_photos:
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_photos_location_id ON photos (location_id)"
+        )
+
+def has_check_constraints(conn):
+    """True when locations and photos were created with the CHECK constraints from create_tables."""
+    tables = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name IN ('locations', 'photos')"
+    ).fetchall()
+    return len(tables) == 2 and all("CHECK" in sql for (sql,) in tables)
+
 def create_tables():
     """Creates the necessary tables in the database."""
     conn = create_connection()
@@ -23,9 +51,9 @@ def create_tables():
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS locations (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    location_name TEXT NOT NULL,
-                    latitude REAL NOT NULL,
-                    longitude REAL NOT NULL
+                    location_name TEXT NOT NULL UNIQUE,
+                    latitude REAL NOT NULL CHECK (latitude BETWEEN -90 AND 90),
+                    longitude REAL NOT NULL CHECK (longitude BETWEEN -180 AND 180)
                 )
             """)
 
@@ -34,13 +62,15 @@ def create_tables():
                 CREATE TABLE IF NOT EXISTS photos (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     location_id INTEGER NOT NULL,
-                    photo_url TEXT NOT NULL,
+                    photo_url TEXT NOT NULL CHECK (photo_url LIKE 'http%://%'),
                     date_taken TEXT,
                     description TEXT,
                     FOREIGN KEY (location_id) REFERENCES locations (id)
                 )
             """)
 
+            upgrade_schema(conn)
+
             conn.commit()
             print("Tables created successfully.")
         except sqlite3.Error as e:
@@ -6,7 +6,9 @@ app = marimo.App(width="medium", title="Austin Walkability Prediction")
 
 @app.cell
 def _():
+    import hashlib
     import io
+    import json
     import os
     import warnings
     import zipfile
@@ -39,7 +41,9 @@ def _():
         folium,
         genai,
         gpd,
+        hashlib,
         io,
+        json,
         load_dotenv,
         mean_squared_error,
         mo,
@@ -416,8 +420,11 @@ def _(CENTER, features_out, folium, mo):
 
 
 @app.cell
-def _(GEMINI_API_KEY, genai, mo, shap_context, types):
+def _(CACHE_DIR, GEMINI_API_KEY, genai, hashlib, json, mo, shap_context, types):
     _client = genai.Client(api_key=GEMINI_API_KEY)
+    _model = "gemini-2.0-flash"
+    _reply_dir = CACHE_DIR / "gemini"
+    _reply_dir.mkdir(exist_ok=True)
     _system_prompt = (
         "You are an expert in urban walkability and data science. "
         "You have access to results from an XGBoost model predicted EPA National Walkability Index scores "
@@ -426,6 +433,18 @@ def _(GEMINI_API_KEY, genai, mo, shap_context, types):
     )
 
     def _call_gemini(messages, config):
+        # Replies are cached on disk by model, system prompt and full conversation
+        _key = hashlib.sha256(
+            json.dumps(
+                [_model, _system_prompt, [(msg.role, msg.content) for msg in messages]],
+                default=str,
+            ).encode()
+        ).hexdigest()
+        _reply_path = _reply_dir / f"{_key}.txt"
+        if _reply_path.exists():
+            yield _reply_path.read_text(encoding="utf-8")
+            return
+
         _contents = [
             types.Content(
                 role="user" if msg.role == "user" else "model",
@@ -433,11 +452,21 @@ def _(GEMINI_API_KEY, genai, mo, shap_context, types):
             )
             for msg in messages
         ]
-        return _client.models.generate_content(
-            model="gemini-2.0-flash",
+        # Yield text as it arrives; mo.ui.chat appends each chunk to the reply.
+        # The system instruction is an identical prefix on every call, which
+        # Gemini's implicit prompt caching reuses server-side
+        _reply = []
+        for _chunk in _client.models.generate_content_stream(
+            model=_model,
             contents=_contents,
             config=types.GenerateContentConfig(system_instruction=_system_prompt),
-        ).text
+        ):
+            if _chunk.text:
+                _reply.append(_chunk.text)
+                yield _chunk.text
+        # Empty (e.g. safety-blocked) completions aren't cached, so they get retried
+        if _reply:
+            _reply_path.write_text("".join(_reply), encoding="utf-8")
 
     chat = mo.ui.chat(
         _call_gemini,